@@ -1,7 +1,16 @@
 
+import atexit
+import functools
 import os
+import queue
+import shutil
+import signal
 import sqlite3
-from datetime import datetime, timedelta
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
 import telebot
 from telebot import types
@@ -28,19 +37,156 @@ if not ADMIN_ID:
         "Добавьте числовой Telegram ID в .env и перезапустите скрипт."
     )
 
-
-bot = telebot.TeleBot(TOKEN)
+# Сохранять ли каждое событие в таблицу interactions (из .env, по умолчанию нет).
+# Статистика считается по дневным сводкам, сырой журнал нужен только для отладки
+KEEP_RAW_INTERACTIONS = (config.get("KEEP_RAW_INTERACTIONS") or "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Через сколько дней удалять строки из interactions (из .env). По умолчанию 0 —
+# журнал не чистится; сводки за эти дни остаются в daily_stats/daily_users
+RAW_INTERACTIONS_RETENTION_DAYS = int(config.get("RAW_INTERACTIONS_RETENTION_DAYS") or 0)
+
+# Текущий umask процесса: читается один раз при импорте, до запуска потоков,
+# потому что узнать его можно только временно сменив
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+# Обработчики выполняются параллельно в пуле потоков telebot; запись в БД
+# идёт через фоновый StorageWorker, а чтение — через пул соединений
+_HANDLER_THREADS = 8
+bot = telebot.TeleBot(TOKEN, num_threads=_HANDLER_THREADS)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "bot_stats.db")
+# Файл, в который дописывается статистика за прошедшие месяцы
+_STATS_FILE_PATH = os.path.join(BASE_DIR, "statistic.txt")
+
+_MONTH_NAMES = (
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь",
+)
+
+# Пул открытых соединений с БД: соединение берётся на время запроса и
+# возвращается обратно, вместо открытия/закрытия файла на каждое сообщение.
+# Размер пула покрывает все потоки, работающие с БД одновременно (обработчики,
+# StorageWorker и таймер месячной статистики), поэтому соединения не закрываются
+_POOL_SIZE = _HANDLER_THREADS + 2
+_POOL: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=_POOL_SIZE)
+
+
+# Настройки SQLite для каждого нового соединения:
+# page_size действует только для ещё пустого файла БД (до создания таблиц
+# и перехода в WAL), для существующей базы команда ничего не меняет;
+# WAL — запись не блокирует чтение (статистика админа), synchronous=NORMAL
+# безопасен в режиме WAL и не делает fsync на каждую транзакцию;
+# mmap_size — чтение страниц через отображение файла в память без копирования;
+# busy_timeout — ждать освобождения блокировки, а не падать с SQLITE_BUSY
+_PRAGMAS = (
+    "PRAGMA page_size=8192",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def _connect() -> sqlite3.Connection:
+    """Открывает новое соединение с БД для пула (режим autocommit)."""
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=256,
+    )
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def get_conn():
+    """
+    Выдаёт соединение из пула на время блока `with` и возвращает его обратно.
+    Если пул пуст — открывает новое соединение, если переполнен — закрывает лишнее.
+    """
+    try:
+        conn = _POOL.get_nowait()
+    except queue.Empty:
+        conn = _connect()
+    try:
+        yield conn
+    except BaseException:
+        # Не возвращаем в пул соединение с незавершённой транзакцией
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        try:
+            _POOL.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+# Версия схемы БД (PRAGMA user_version):
+#   1 — время в interactions.ts и users.first_seen/last_seen хранится как unix-время
+_SCHEMA_VERSION = 1
+
+# Столбцы, где старая схема хранила время строкой ISO 8601
+_LEGACY_TIME_COLUMNS = {
+    "interactions": ("ts",),
+    "users": ("first_seen", "last_seen"),
+}
+
+
+def _rename_legacy_time_tables(cur: sqlite3.Cursor) -> list[str]:
+    """
+    Переименовывает таблицы, где время ещё хранится строкой, в `<имя>_legacy`,
+    чтобы init_db создал их заново с INTEGER-столбцами. Возвращает имена таблиц.
+    """
+    legacy = []
+    for table, columns in _LEGACY_TIME_COLUMNS.items():
+        cur.execute(f"PRAGMA table_info({table})")
+        if any(row[1] in columns and row[2].upper() == "TEXT" for row in cur.fetchall()):
+            cur.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+            legacy.append(table)
+    return legacy
+
+
+def _copy_legacy_time_tables(cur: sqlite3.Cursor, tables: list[str]) -> None:
+    """Переносит данные из `<имя>_legacy`, переводя строки ISO 8601 в unix-время."""
+    for table in tables:
+        cur.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cur.fetchall()]
+        select = ", ".join(
+            f"CAST(strftime('%s', {col}) AS INTEGER)"
+            if col in _LEGACY_TIME_COLUMNS[table]
+            else col
+            for col in columns
+        )
+        cur.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {select} FROM {table}_legacy"
+        )
+        cur.execute(f"DROP TABLE {table}_legacy")
 
 
 def init_db() -> None:
     """Создаёт таблицы для статистики, если их ещё нет."""
-    conn = sqlite3.connect(DB_PATH)
-    try:
+    with get_conn() as conn:
         cur = conn.cursor()
-        # Агрегированная информация по пользователям
+        # Переход со старых версий схемы выполняется одной транзакцией
+        cur.execute("PRAGMA user_version")
+        migrate = cur.fetchone()[0] < _SCHEMA_VERSION
+        legacy_tables = []
+        if migrate:
+            cur.execute("BEGIN IMMEDIATE")
+            legacy_tables = _rename_legacy_time_tables(cur)
+        # Агрегированная информация по пользователям (first_seen/last_seen — unix-время)
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS users (
@@ -48,25 +194,74 @@ def init_db() -> None:
                 username       TEXT,
                 first_name     TEXT,
                 last_name      TEXT,
-                first_seen     TEXT,
-                last_seen      TEXT,
+                first_seen     INTEGER,
+                last_seen      INTEGER,
                 total_messages INTEGER DEFAULT 0,
                 about_clicks   INTEGER DEFAULT 0,
                 cases_clicks   INTEGER DEFAULT 0
             )
             """
         )
-        # Подробные события для помесячной статистики
+        # Подробный журнал событий, см. KEEP_RAW_INTERACTIONS (ts — unix-время, UTC)
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS interactions (
                 id      INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 button  TEXT,
-                ts      TEXT NOT NULL
+                ts      INTEGER NOT NULL
             )
             """
         )
+        if migrate:
+            _copy_legacy_time_tables(cur, legacy_tables)
+            cur.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            cur.execute("COMMIT")
+        # Дневные сводки: количество событий по кнопкам и уникальные
+        # пользователи за каждый день (day — номер дня от 1970-01-01, UTC)
+        cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats'"
+        )
+        need_backfill = cur.fetchone() is None
+        if need_backfill:
+            cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day     INTEGER NOT NULL,
+                button  TEXT NOT NULL,
+                cnt     INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, button)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_users (
+                day     INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (day, user_id)
+            ) WITHOUT ROWID
+            """
+        )
+        if need_backfill:
+            # Заполняем сводки по уже накопленным событиям
+            cur.execute(
+                f"""
+                INSERT INTO daily_stats (day, button, cnt)
+                SELECT ts / {_SECONDS_PER_DAY}, button, COUNT(*)
+                FROM interactions
+                GROUP BY 1, 2
+                """
+            )
+            cur.execute(
+                f"""
+                INSERT OR IGNORE INTO daily_users (day, user_id)
+                SELECT ts / {_SECONDS_PER_DAY}, user_id
+                FROM interactions
+                """
+            )
+            cur.execute("COMMIT")
         # Таблица для заявок с телефонами
         cur.execute(
             """
@@ -93,168 +288,389 @@ def init_db() -> None:
             )
             """
         )
-        conn.commit()
-    finally:
-        conn.close()
+
+
+# ISO 8601 с точностью до секунды; форматируется через time.strftime,
+# без создания промежуточных объектов datetime
+_ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
 
 def _now_iso() -> str:
     """Текущее время в ISO-формате (UTC)."""
-    return datetime.utcnow().isoformat()
+    return time.strftime(_ISO_FORMAT, time.gmtime())
+
+
+def _now_ts() -> int:
+    """Текущее unix-время в секундах."""
+    return int(time.time())
+
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _day_from_ts(ts: int) -> int:
+    """Номер дня (UTC) от 1970-01-01 для unix-времени."""
+    return ts // _SECONDS_PER_DAY
+
+
+# SQL-запросы записи, которые выполняются на каждое сообщение: одни и те же
+# строки позволяют SQLite брать готовые подготовленные выражения из кэша
+# (cached_statements в _connect)
+_SQL_INSERT_INTERACTION = "INSERT INTO interactions (user_id, button, ts) VALUES (?, ?, ?)"
+_SQL_UPSERT_USER = """
+    INSERT INTO users (
+        user_id, username, first_name, last_name,
+        first_seen, last_seen,
+        total_messages, about_clicks, cases_clicks
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username       = excluded.username,
+        first_name     = excluded.first_name,
+        last_name      = excluded.last_name,
+        last_seen      = excluded.last_seen,
+        total_messages = users.total_messages + excluded.total_messages,
+        about_clicks   = users.about_clicks + excluded.about_clicks,
+        cases_clicks   = users.cases_clicks + excluded.cases_clicks
+"""
+_SQL_UPSERT_DAILY_STATS = """
+    INSERT INTO daily_stats (day, button, cnt) VALUES (?, ?, ?)
+    ON CONFLICT(day, button) DO UPDATE SET cnt = daily_stats.cnt + excluded.cnt
+"""
+_SQL_INSERT_DAILY_USER = "INSERT OR IGNORE INTO daily_users (day, user_id) VALUES (?, ?)"
+_SQL_INSERT_APPLICATION = """
+    INSERT INTO applications (user_id, username, first_name, last_name, phone, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+def _is_busy_error(exc: sqlite3.OperationalError) -> bool:
+    """Временная ошибка: БД заблокирована другим соединением."""
+    return exc.sqlite_errorcode in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+# Версия данных статистики: увеличивается после каждой записанной пачки событий
+_stats_version = 0
+
+
+class StorageWorker(threading.Thread):
+    """
+    Фоновый поток записи в БД.
+
+    Обработчики сообщений только кладут событие в очередь и сразу отвечают
+    пользователю, а поток забирает накопившиеся события пачкой и записывает
+    их одной транзакцией через executemany.
+
+    Формат событий:
+        - {"kind": "interaction", "user": User, "button": str | None, "ts": int}
+        - {"kind": "application", "user": User, "phone": str, "ts": str}
+    """
+
+    # Максимальное количество событий, записываемых одной транзакцией
+    BATCH_SIZE = 200
+    # Сколько секунд после первого события ждать следующие, чтобы
+    # записать их той же транзакцией (один fsync на всю пачку)
+    FLUSH_INTERVAL = 0.05
+    # Повторы при занятой БД (SQLITE_BUSY / «database is locked»): задержка
+    # растёт вдвое от RETRY_DELAY до RETRY_MAX_DELAY, всего не дольше BUSY_TIMEOUT
+    RETRY_DELAY = 0.1
+    RETRY_MAX_DELAY = 10.0
+    BUSY_TIMEOUT = 600.0
+    # Сколько раз повторять запись при прочих ошибках БД
+    ERROR_ATTEMPTS = 3
+
+    def __init__(self) -> None:
+        super().__init__(name="storage-worker", daemon=True)
+        self._queue: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+
+    def submit(self, event: dict) -> None:
+        """Ставит событие в очередь на запись."""
+        self._queue.put(event)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """
+        Дожидается записи всех событий, поставленных в очередь до вызова.
+        Если поток не запущен, записывает их в вызывающем потоке.
+        """
+        if not self.is_alive():
+            batch = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, dict):
+                    batch.append(item)
+            self._write_safely(batch)
+            return
+
+        # Поток запишет текущую пачку вместе с остатком очереди и выставит флаг
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def run(self) -> None:
+        while True:
+            # Ждём первое событие, затем добираем пачку в течение FLUSH_INTERVAL
+            # (или до запроса flush(), который нужно выполнить сразу)
+            batch = []
+            waiters = []
+            try:
+                item = self._queue.get()
+                deadline = time.monotonic() + self.FLUSH_INTERVAL
+                while True:
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                        deadline = 0.0
+                    else:
+                        batch.append(item)
+                    if len(batch) >= self.BATCH_SIZE:
+                        break
+                    timeout = deadline - time.monotonic()
+                    try:
+                        if timeout > 0:
+                            item = self._queue.get(timeout=timeout)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                self._write_safely(batch)
+            except Exception as exc:
+                # Поток записи один: любая ошибка не должна его остановить
+                print(f"Ошибка в потоке записи, пропущено {len(batch)} событий: {exc!r}")
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+
+    def _write_safely(self, batch: list[dict]) -> None:
+        """
+        Записывает пачку, не давая ошибке БД остановить поток.
+
+        Пока БД занята (например, идёт VACUUM), запись повторяется с растущей
+        задержкой. При прочих ошибках пачка повторяется ERROR_ATTEMPTS раз, затем
+        заявки пробуются записать отдельно от остальных событий. Если и это не
+        удалось, в лог выводятся только id пользователей, оставивших заявки
+        (сами заявки администратор уже получил в Telegram).
+        """
+        if not batch:
+            return
+        delay = self.RETRY_DELAY
+        busy_deadline = time.monotonic() + self.BUSY_TIMEOUT
+        errors = 0
+        while True:
+            try:
+                self._write_batch(batch)
+                return
+            except sqlite3.OperationalError as exc:
+                if not _is_busy_error(exc) or time.monotonic() >= busy_deadline:
+                    errors += 1
+                    error = exc
+                else:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.RETRY_MAX_DELAY)
+                    continue
+            except sqlite3.Error as exc:
+                errors += 1
+                error = exc
+
+            if errors < self.ERROR_ATTEMPTS:
+                time.sleep(delay)
+                continue
+
+            applications = [event for event in batch if event.get("kind") == "application"]
+            if applications and len(applications) < len(batch):
+                print(
+                    f"Не удалось записать {len(batch) - len(applications)} событий в БД: "
+                    f"{error}. Повторяем запись заявок отдельно."
+                )
+                batch = applications
+                errors = 0
+                continue
+
+            print(f"Не удалось записать {len(batch)} событий в БД: {error}")
+            if applications:
+                user_ids = ", ".join(str(event["user"].id) for event in applications)
+                print(f"Не записаны заявки {len(applications)} шт., user_id: {user_ids}")
+            return
+
+    @staticmethod
+    def _write_batch(batch: list[dict]) -> None:
+        """Записывает пачку событий в БД одной транзакцией."""
+        interaction_rows = []
+        # Изменения по каждому пользователю суммируются, чтобы в пачке был
+        # один UPSERT на пользователя, а не на каждое его сообщение
+        user_deltas: dict[int, list] = {}
+        # Счётчики для дневных сводок: (день, кнопка) -> кол-во, (день, пользователь)
+        daily_counts: dict[tuple[int, str], int] = {}
+        daily_users: set[tuple[int, int]] = set()
+        application_rows = []
+
+        for event in batch:
+            user = event["user"]
+            if event["kind"] == "interaction":
+                button = event["button"]
+                button_label = button or "other"
+                seen = event["ts"]
+                day = _day_from_ts(event["ts"])
+                if KEEP_RAW_INTERACTIONS:
+                    interaction_rows.append((user.id, button_label, event["ts"]))
+                daily_counts[day, button_label] = daily_counts.get((day, button_label), 0) + 1
+                daily_users.add((day, user.id))
+                delta = user_deltas.get(user.id)
+                if delta is None:
+                    delta = user_deltas[user.id] = [user.id, None, None, None, seen, seen, 0, 0, 0]
+                delta[1:4] = user.username, user.first_name, user.last_name
+                delta[5] = seen
+                delta[6] += 1
+                delta[7] += button == "about"
+                delta[8] += button == "cases"
+            elif event["kind"] == "application":
+                application_rows.append(
+                    (
+                        user.id,
+                        user.username,
+                        user.first_name,
+                        user.last_name,
+                        event["phone"],
+                        event["ts"],
+                    )
+                )
+
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+
+            # Логируем каждое взаимодействие, если включён сырой журнал
+            if interaction_rows:
+                cur.executemany(_SQL_INSERT_INTERACTION, interaction_rows)
+
+            # Обновляем агрегированную таблицу пользователей
+            cur.executemany(_SQL_UPSERT_USER, user_deltas.values())
+
+            # Дневные сводки для статистики за период
+            cur.executemany(
+                _SQL_UPSERT_DAILY_STATS,
+                ((day, button, cnt) for (day, button), cnt in daily_counts.items()),
+            )
+            cur.executemany(_SQL_INSERT_DAILY_USER, daily_users)
+
+            # Заявки с телефонами
+            cur.executemany(_SQL_INSERT_APPLICATION, application_rows)
+            cur.execute("COMMIT")
+
+        # Закэшированная статистика устарела
+        global _stats_version
+        _stats_version += 1
+
+
+_storage = StorageWorker()
 
 
 def track_user_interaction(message, button: str | None = None) -> None:
     """
     Сохраняет/обновляет информацию о пользователе и считает нажатия кнопок.
+    Запись выполняется в фоне (см. StorageWorker).
 
     button:
         - "about"  — нажата кнопка «О нас»
         - "cases"  — нажата кнопка «Кейсы»
         - None     — любое другое сообщение (включая /start)
     """
-    user = message.from_user
+    _storage.submit(
+        {
+            "kind": "interaction",
+            "user": message.from_user,
+            "button": button,
+            "ts": _now_ts(),
+        }
+    )
 
-    about_inc = 1 if button == "about" else 0
-    cases_inc = 1 if button == "cases" else 0
-    button_label = button or "other"
 
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        now = _now_iso()
-
-        # Логируем каждое взаимодействие
-        cur.execute(
-            "INSERT INTO interactions (user_id, button, ts) VALUES (?, ?, ?)",
-            (user.id, button_label, now),
-        )
-
-        # Обновляем агрегированную таблицу пользователей
-        cur.execute(
-            """
-            INSERT INTO users (
-                user_id, username, first_name, last_name,
-                first_seen, last_seen,
-                total_messages, about_clicks, cases_clicks
-            )
-            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                username       = excluded.username,
-                first_name     = excluded.first_name,
-                last_name      = excluded.last_name,
-                last_seen      = excluded.last_seen,
-                total_messages = users.total_messages + 1,
-                about_clicks   = users.about_clicks + excluded.about_clicks,
-                cases_clicks   = users.cases_clicks + excluded.cases_clicks
-            """,
-            (
-                user.id,
-                user.username,
-                user.first_name,
-                user.last_name,
-                now,
-                now,
-                about_inc,
-                cases_inc,
-            ),
-        )
-        conn.commit()
-    finally:
-        conn.close()
+# Статистика за всё время: (пользователи, «О нас», «Кейсы», сообщения)
+_SQL_STATS_AGG = """
+    SELECT
+        COUNT(*),
+        COALESCE(SUM(about_clicks), 0),
+        COALESCE(SUM(cases_clicks), 0),
+        COALESCE(SUM(total_messages), 0)
+    FROM users
+"""
+# Статистика за дни [:start, :end) по дневным сводкам: уникальные пользователи,
+# клики по кнопкам и общее количество событий
+_SQL_PERIOD_AGG = """
+    SELECT
+        (
+            SELECT COUNT(DISTINCT user_id)
+            FROM daily_users
+            WHERE day >= :start AND day < :end
+        ) AS total_users,
+        COALESCE(SUM(CASE WHEN button = 'about' THEN cnt ELSE 0 END), 0) AS about_clicks,
+        COALESCE(SUM(CASE WHEN button = 'cases' THEN cnt ELSE 0 END), 0) AS cases_clicks,
+        COALESCE(SUM(cnt), 0) AS total_messages
+    FROM daily_stats
+    WHERE day >= :start AND day < :end
+"""
+
+# Время жизни (в секундах) закэшированной статистики для админа
+_STATS_TTL = 30
+
+
+def _stats_cache_key() -> tuple[int, int]:
+    """
+    Ключ кэша статистики: версия данных (меняется после каждой записи
+    StorageWorker) и номер интервала, который меняется раз в _STATS_TTL секунд.
+    """
+    return _stats_version, _now_ts() // _STATS_TTL
 
 
 def get_stats() -> tuple[int, int, int, int]:
     """
     Возвращает агрегированную статистику за всё время:
     (кол-во пользователей, нажатий «О нас», нажатий «Кейсы», общее кол-во сообщений).
+    Результат кэшируется, пока в БД не появятся новые записи (не дольше _STATS_TTL секунд).
     """
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM users")
-        total_users = cur.fetchone()[0] or 0
+    return _query_stats(_stats_cache_key())
 
-        cur.execute(
-            "SELECT SUM(about_clicks), SUM(cases_clicks), SUM(total_messages) FROM users"
-        )
-        row = cur.fetchone()
-        about_clicks = row[0] or 0
-        cases_clicks = row[1] or 0
-        total_messages = row[2] or 0
+
+@functools.lru_cache(maxsize=4)
+def _query_stats(key: tuple[int, int]) -> tuple[int, int, int, int]:
+    """Считает статистику за всё время; `key` — ключ кэша (см. _stats_cache_key)."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(_SQL_STATS_AGG)
+        total_users, about_clicks, cases_clicks, total_messages = cur.fetchone()
 
         return int(total_users), int(about_clicks), int(cases_clicks), int(total_messages)
-    finally:
-        conn.close()
 
 
 def get_month_stats(days: int = 30) -> tuple[int, int, int, int]:
     """
     Статистика за последние `days` дней (по умолчанию 30):
     (кол-во пользователей, нажатий «О нас», нажатий «Кейсы», общее кол-во сообщений).
+    Результат кэшируется, пока в БД не появятся новые записи (не дольше _STATS_TTL секунд).
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    cutoff_iso = cutoff.isoformat()
+    return _query_month_stats(days, _stats_cache_key())
 
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-
-        # Сколько уникальных пользователей взаимодействовали за период
-        cur.execute(
-            "SELECT COUNT(DISTINCT user_id) FROM interactions WHERE ts >= ?",
-            (cutoff_iso,),
-        )
-        total_users = cur.fetchone()[0] or 0
-
-        # Клики по кнопкам и общее количество событий
-        cur.execute(
-            """
-            SELECT
-                SUM(CASE WHEN button = 'about' THEN 1 ELSE 0 END) AS about_clicks,
-                SUM(CASE WHEN button = 'cases' THEN 1 ELSE 0 END) AS cases_clicks,
-                COUNT(*) AS total_messages
-            FROM interactions
-            WHERE ts >= ?
-            """,
-            (cutoff_iso,),
-        )
-        row = cur.fetchone()
-        about_clicks = row[0] or 0
-        cases_clicks = row[1] or 0
-        total_messages = row[2] or 0
 
-        return int(total_users), int(about_clicks), int(cases_clicks), int(total_messages)
-    finally:
-        conn.close()
+@functools.lru_cache(maxsize=4)
+def _query_month_stats(days: int, key: tuple[int, int]) -> tuple[int, int, int, int]:
+    """Считает статистику за последние `days` дней (включая сегодня); `key` — ключ кэша."""
+    today = _day_from_ts(_now_ts())
+    return _period_stats(today - days + 1, today + 1)
 
 
-def save_application(user, phone: str) -> None:
+def save_application(user, phone: str) -> str:
     """
-    Сохраняет заявку в БД и отправляет уведомление администратору.
+    Сохраняет заявку в БД (в фоне, см. StorageWorker).
+    Возвращает время заявки для уведомления администратора.
     """
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        now = _now_iso()
-        cur.execute(
-            """
-            INSERT INTO applications (user_id, username, first_name, last_name, phone, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                user.id,
-                user.username,
-                user.first_name,
-                user.last_name,
-                phone,
-                now,
-            ),
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    now = _now_iso()
+    _storage.submit({"kind": "application", "user": user, "phone": phone, "ts": now})
+    return now
+
 
-    # Отправляем уведомление администратору
+def notify_admin_about_application(user, phone: str, created_at: str) -> None:
+    """Отправляет администратору уведомление о новой заявке."""
     admin_message = (
         "🔔 *Новая заявка*\n\n"
         f"Пользователь оставил заявку на получение продукта.\n\n"
@@ -264,70 +680,64 @@ def save_application(user, phone: str) -> None:
         f"Фамилия: {user.last_name or 'не указано'}\n"
         f"Username: @{user.username or 'не указан'}\n\n"
         f"📞 *Телефон:* `{phone}`\n\n"
-        f"⏰ Время заявки: {now}\n\n"
+        f"⏰ Время заявки: {created_at}\n\n"
         f"Пожалуйста, свяжитесь с клиентом как можно скорее!"
     )
     bot.send_message(ADMIN_ID, admin_message, parse_mode="Markdown")
 
 
+# Все байты, кроме ASCII-цифр, — удаляются из номера одним вызовом bytes.translate
+_NON_DIGIT_BYTES = bytes(b for b in range(256) if not 0x30 <= b <= 0x39)
+
+
 def is_phone_number(text: str) -> bool:
     """
     Проверяет, похож ли текст на номер телефона.
     """
-    # Убираем все пробелы, дефисы, скобки и плюсы
-    cleaned = "".join(c for c in text if c.isdigit() or c == "+")
-    # Проверяем, что осталось достаточно цифр (минимум 10)
-    digits = "".join(c for c in cleaned if c.isdigit())
+    # В тексте короче 10 символов не может быть 10 цифр
+    if len(text) < 10:
+        return False
+    # Убираем всё, кроме цифр (пробелы, дефисы, скобки, плюсы),
+    # и проверяем, что осталось достаточно цифр (минимум 10)
+    digits = text.encode("ascii", "ignore").translate(None, _NON_DIGIT_BYTES)
     return len(digits) >= 10
 
 
+@functools.lru_cache(maxsize=32)
+def _month_day_bounds(year: int, month: int) -> tuple[int, int]:
+    """Номера дней (см. _day_from_ts) начала месяца и начала следующего месяца."""
+    # Определяем начало и конец месяца
+    if month == 12:
+        start_date = datetime(year, month, 1, tzinfo=timezone.utc)
+        end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        start_date = datetime(year, month, 1, tzinfo=timezone.utc)
+        end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+
+    return (
+        _day_from_ts(int(start_date.timestamp())),
+        _day_from_ts(int(end_date.timestamp())),
+    )
+
+
 def get_month_stats_for_period(year: int, month: int) -> tuple[int, int, int, int]:
     """
     Получает статистику за конкретный месяц и год.
     Возвращает: (кол-во пользователей, нажатий «О нас», нажатий «Кейсы», общее кол-во сообщений).
     """
-    # Определяем начало и конец месяца
-    if month == 12:
-        start_date = datetime(year, month, 1)
-        end_date = datetime(year + 1, 1, 1)
-    else:
-        start_date = datetime(year, month, 1)
-        end_date = datetime(year, month + 1, 1)
-    
-    start_iso = start_date.isoformat()
-    end_iso = end_date.isoformat()
+    start_day, end_day = _month_day_bounds(year, month)
+    return _period_stats(start_day, end_day)
 
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
 
-        # Сколько уникальных пользователей взаимодействовали за период
-        cur.execute(
-            "SELECT COUNT(DISTINCT user_id) FROM interactions WHERE ts >= ? AND ts < ?",
-            (start_iso, end_iso),
-        )
-        total_users = cur.fetchone()[0] or 0
+def _period_stats(start_day: int, end_day: int) -> tuple[int, int, int, int]:
+    """Считает статистику за дни [start_day, end_day) по дневным сводкам."""
+    with get_conn() as conn:
+        cur = conn.cursor()
 
-        # Клики по кнопкам и общее количество событий
-        cur.execute(
-            """
-            SELECT
-                SUM(CASE WHEN button = 'about' THEN 1 ELSE 0 END) AS about_clicks,
-                SUM(CASE WHEN button = 'cases' THEN 1 ELSE 0 END) AS cases_clicks,
-                COUNT(*) AS total_messages
-            FROM interactions
-            WHERE ts >= ? AND ts < ?
-            """,
-            (start_iso, end_iso),
-        )
-        row = cur.fetchone()
-        about_clicks = row[0] or 0
-        cases_clicks = row[1] or 0
-        total_messages = row[2] or 0
+        cur.execute(_SQL_PERIOD_AGG, {"start": start_day, "end": end_day})
+        total_users, about_clicks, cases_clicks, total_messages = cur.fetchone()
 
         return int(total_users), int(about_clicks), int(cases_clicks), int(total_messages)
-    finally:
-        conn.close()
 
 
 def save_monthly_stats_to_file(year: int, month: int) -> bool:
@@ -335,99 +745,233 @@ def save_monthly_stats_to_file(year: int, month: int) -> bool:
     Сохраняет статистику за указанный месяц в файл statistic.txt.
     Возвращает True, если сохранение успешно, False если уже было сохранено ранее.
     """
-    conn = sqlite3.connect(DB_PATH)
-    try:
+    # Проверяем, не сохранялась ли уже статистика за этот месяц
+    with get_conn() as conn:
         cur = conn.cursor()
-        # Проверяем, не сохранялась ли уже статистика за этот месяц
         cur.execute(
             "SELECT id FROM monthly_stats_saves WHERE year = ? AND month = ?",
             (year, month),
         )
         if cur.fetchone():
             return False  # Уже сохранено ранее
-        
-        # Получаем статистику за месяц
-        total_users, about_clicks, cases_clicks, total_messages = get_month_stats_for_period(
-            year, month
-        )
-        
-        # Формируем текст для сохранения
-        month_names = [
-            "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
-            "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
-        ]
-        month_name = month_names[month - 1]
-        
-        stats_text = (
-            f"Статистика за {month_name} {year} года\n"
-            f"{'=' * 50}\n"
-            f"Пользователей взаимодействовало: {total_users}\n"
-            f"Нажатий «О нас»: {about_clicks}\n"
-            f"Нажатий «Кейсы»: {cases_clicks}\n"
-            f"Всего сообщений: {total_messages}\n"
-            f"{'=' * 50}\n\n"
-        )
-        
-        # Сохраняем в файл
-        stats_file_path = os.path.join(BASE_DIR, "statistic.txt")
-        with open(stats_file_path, "a", encoding="utf-8") as f:
-            f.write(stats_text)
-        
-        # Отмечаем, что статистика сохранена
-        now = _now_iso()
-        cur.execute(
-            "INSERT INTO monthly_stats_saves (year, month, saved_at) VALUES (?, ?, ?)",
-            (year, month, now),
-        )
-        conn.commit()
+
+    # Получаем статистику за месяц
+    total_users, about_clicks, cases_clicks, total_messages = get_month_stats_for_period(
+        year, month
+    )
+
+    # Формируем текст для сохранения
+    month_name = _MONTH_NAMES[month - 1]
+
+    stats_text = (
+        f"Статистика за {month_name} {year} года\n"
+        f"{'=' * 50}\n"
+        f"Пользователей взаимодействовало: {total_users}\n"
+        f"Нажатий «О нас»: {about_clicks}\n"
+        f"Нажатий «Кейсы»: {cases_clicks}\n"
+        f"Всего сообщений: {total_messages}\n"
+        f"{'=' * 50}\n\n"
+    )
+
+    # Готовим новую версию файла во временном файле (без соединения с БД),
+    # чтобы при сбое statistic.txt не остался дописанным наполовину
+    try:
+        with open(_STATS_FILE_PATH, encoding="utf-8") as f:
+            previous_text = f.read()
+        had_file = True
+    except FileNotFoundError:
+        previous_text = ""
+        had_file = False
+    tmp_path = _prepare_stats_file(previous_text + stats_text)
+    try:
+        # Под блокировкой записи ещё раз проверяем отметку, подменяем файл
+        # и отмечаем, что статистика сохранена — одной транзакцией
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(
+                "SELECT id FROM monthly_stats_saves WHERE year = ? AND month = ?",
+                (year, month),
+            )
+            if cur.fetchone():
+                cur.execute("ROLLBACK")
+                return False  # Успели сохранить параллельно
+            os.replace(tmp_path, _STATS_FILE_PATH)
+            try:
+                cur.execute(
+                    "INSERT INTO monthly_stats_saves (year, month, saved_at) VALUES (?, ?, ?)",
+                    (year, month, _now_iso()),
+                )
+                cur.execute("COMMIT")
+            except BaseException:
+                # Отметка не записана — возвращаем прежний файл, чтобы при
+                # следующей попытке месяц не попал в statistic.txt дважды
+                if had_file:
+                    os.replace(_prepare_stats_file(previous_text), _STATS_FILE_PATH)
+                else:
+                    os.remove(_STATS_FILE_PATH)
+                raise
         return True
     finally:
-        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _prepare_stats_file(text: str) -> str:
+    """
+    Записывает текст во временный файл рядом с statistic.txt и возвращает его путь.
+    Права берутся у текущего statistic.txt, а если его нет — обычные с учётом umask
+    (mkstemp создаёт файл с правами 0600).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=BASE_DIR, prefix="statistic.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(_STATS_FILE_PATH):
+            shutil.copymode(_STATS_FILE_PATH, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
 
 
 def check_and_save_monthly_stats() -> None:
     """
-    Проверяет, является ли сегодня 1-е число месяца, и если да,
-    сохраняет статистику за предыдущий месяц в файл.
+    Сохраняет статистику за предыдущий месяц в файл, если она ещё не сохранена.
+    День месяца не проверяется: если бот был выключен 1-го числа или таймер
+    сработал позже, месяц всё равно будет сохранён при следующей проверке.
     """
-    today = datetime.utcnow()
-    
-    # Проверяем, является ли сегодня 1-е число месяца
-    if today.day != 1:
-        return
+    today = time.gmtime()
     
     # Определяем предыдущий месяц
-    if today.month == 1:
+    if today.tm_mon == 1:
         prev_month = 12
-        prev_year = today.year - 1
+        prev_year = today.tm_year - 1
     else:
-        prev_month = today.month - 1
-        prev_year = today.year
+        prev_month = today.tm_mon - 1
+        prev_year = today.tm_year
     
     # Сохраняем статистику за предыдущий месяц
     save_monthly_stats_to_file(prev_year, prev_month)
 
 
+def prune_raw_interactions() -> None:
+    """
+    Удаляет из interactions строки старше RAW_INTERACTIONS_RETENTION_DAYS дней
+    и сжимает файл БД. Все эти события уже учтены в daily_stats/daily_users.
+    Если срок хранения не задан, журнал не трогаем.
+
+    Пока идёт VACUUM, фоновый поток записи ждёт и повторяет запись.
+    """
+    if RAW_INTERACTIONS_RETENTION_DAYS <= 0:
+        return
+    cutoff = int(time.time()) - RAW_INTERACTIONS_RETENTION_DAYS * _SECONDS_PER_DAY
+    with get_conn() as conn:
+        deleted = conn.execute("DELETE FROM interactions WHERE ts < ?", (cutoff,)).rowcount
+        if deleted > 0:
+            conn.execute("VACUUM")
+
+
+def _seconds_until_monthly_save() -> float:
+    """Сколько секунд осталось до ближайшего 1-го числа месяца, 00:05 UTC."""
+    now = datetime.now(timezone.utc)
+    run_at = now.replace(day=1, hour=0, minute=5, second=0, microsecond=0)
+    if run_at <= now:
+        if run_at.month == 12:
+            run_at = run_at.replace(year=run_at.year + 1, month=1)
+        else:
+            run_at = run_at.replace(month=run_at.month + 1)
+    return (run_at - now).total_seconds()
+
+
+def schedule_monthly_stats() -> None:
+    """
+    Планирует сохранение статистики за предыдущий месяц на 1-е число в 00:05 UTC,
+    чтобы оно не зависело от того, перезапускался ли бот в этот день.
+    """
+    timer = threading.Timer(_seconds_until_monthly_save(), _run_monthly_stats)
+    timer.daemon = True
+    timer.start()
+
+
+def _run_monthly_stats() -> None:
+    """
+    Задача таймера: сохраняет статистику, чистит старый сырой журнал
+    и планирует следующий запуск.
+    """
+    try:
+        check_and_save_monthly_stats()
+        prune_raw_interactions()
+    except (sqlite3.Error, OSError) as exc:
+        print(f"Не удалось сохранить месячную статистику: {exc}")
+    finally:
+        schedule_monthly_stats()
+
+
+# Основные клавиатуры собираются один раз при запуске
+_KB_USER = types.ReplyKeyboardMarkup(resize_keyboard=True)
+_KB_USER.add(types.KeyboardButton("О нас"), types.KeyboardButton("Кейсы"))
+
+# Кнопка "Статистика" доступна только администратору
+_KB_ADMIN = types.ReplyKeyboardMarkup(resize_keyboard=True)
+_KB_ADMIN.row(
+    types.KeyboardButton("О нас"),
+    types.KeyboardButton("Кейсы"),
+    types.KeyboardButton("Статистика"),
+)
+
+
+def _main_keyboard(user_id: int) -> types.ReplyKeyboardMarkup:
+    """Основная клавиатура: у администратора дополнительно есть кнопка «Статистика»."""
+    return _KB_ADMIN if user_id == ADMIN_ID else _KB_USER
+
+
+# Запрос номера телефона после просмотра кейсов
+_KB_PHONE = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+_KB_PHONE.add(types.KeyboardButton("📞 Отправить контакт", request_contact=True))
+
+
+# Неизменяемые тексты ответов
+_ABOUT_TEXT = (
+    "🧾 *О нас*\n\n"
+    "Мы создаём телеграм-ботов и автоматизируем бизнес-процессы.\n"
+    "Помогаем компаниям экономить время и увеличивать продажи."
+)
+_CASES_TEXT = (
+    "📌 *Кейсы*\n\n"
+    "1. Бот для поддержки клиентов — сократил нагрузку на операторов на 40%.\n"
+    "2. Бот для заявок в отдел продаж — ускорил обработку лидов в 2 раза.\n"
+    "3. Внутренний бот-комбайн — автоматизировал рутинные задачи в команде.\n\n"
+    "💡 *Хотите получить наш продукт?*\n\n"
+    "Это очень просто! Оставьте заявку, указав ваш номер телефона, "
+    "и мы свяжемся с вами в ближайшее время."
+)
+_PHONE_REQUEST_TEXT = (
+    "Пожалуйста, отправьте ваш номер телефона для связи.\n"
+    "Вы можете нажать кнопку ниже или ввести номер вручную."
+)
+_THANKS_TEXT = (
+    "✅ Спасибо за ваше обращение!\n\n"
+    "Мы получили вашу заявку и свяжемся с вами в ближайшее время."
+)
+_NO_UNDERSTAND_TEXT = (
+    "Я тебя не понял. Пожалуйста, выбери одну из кнопок: «О нас» или «Кейсы»."
+)
+
+
 @bot.message_handler(commands=["start"])
 def send_welcome(message):
     """Обработчик команды /start: приветствие и показ клавиатуры."""
     track_user_interaction(message, button=None)
 
-    keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    btn_about = types.KeyboardButton("О нас")
-    btn_cases = types.KeyboardButton("Кейсы")
-
-    # Кнопка "Статистика" доступна только администратору
-    if message.from_user.id == ADMIN_ID:
-        btn_stats = types.KeyboardButton("Статистика")
-        keyboard.row(btn_about, btn_cases, btn_stats)
-    else:
-        keyboard.add(btn_about, btn_cases)
-
     bot.send_message(
         message.chat.id,
         "Привет! Я бот компании.\nВыбери нужный раздел на клавиатуре.",
-        reply_markup=keyboard,
+        reply_markup=_main_keyboard(message.from_user.id),
     )
 
 
@@ -447,144 +991,128 @@ def send_stats(message):
     bot.send_message(message.chat.id, text, parse_mode="Markdown")
 
 
+def _accept_application(message, phone: str, prompt: str) -> None:
+    """Сохраняет заявку, благодарит пользователя и уведомляет администратора."""
+    user = message.from_user
+    created_at = save_application(user, phone)
+    try:
+        bot.send_message(message.chat.id, _THANKS_TEXT)
+        # Возвращаем обычную клавиатуру
+        bot.send_message(message.chat.id, prompt, reply_markup=_main_keyboard(user.id))
+    finally:
+        # Уведомляем администратора уже после ответа пользователю,
+        # даже если ответ отправить не удалось
+        notify_admin_about_application(user, phone, created_at)
+
+
 @bot.message_handler(content_types=["contact"])
 def handle_contact(message):
     """Обработчик отправки контакта (номера телефона)."""
     if message.contact and message.contact.phone_number:
-        phone = message.contact.phone_number
-        user = message.from_user
-        
-        # Сохраняем заявку
-        save_application(user, phone)
-        
-        # Благодарим пользователя
-        bot.send_message(
-            message.chat.id,
-            "✅ Спасибо за ваше обращение!\n\n"
-            "Мы получили вашу заявку и свяжемся с вами в ближайшее время.",
-        )
-        
-        # Возвращаем обычную клавиатуру
-        keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        btn_about = types.KeyboardButton("О нас")
-        btn_cases = types.KeyboardButton("Кейсы")
-        if message.from_user.id == ADMIN_ID:
-            btn_stats = types.KeyboardButton("Статистика")
-            keyboard.row(btn_about, btn_cases, btn_stats)
-        else:
-            keyboard.add(btn_about, btn_cases)
-        
-        bot.send_message(
-            message.chat.id,
-            "Выберите нужный раздел на клавиатуре.",
-            reply_markup=keyboard,
+        _accept_application(
+            message, message.contact.phone_number, "Выберите нужный раздел на клавиатуре."
         )
 
 
+def _handle_about(message) -> None:
+    """Кнопка «О нас»."""
+    track_user_interaction(message, button="about")
+    bot.send_message(message.chat.id, _ABOUT_TEXT, parse_mode="Markdown")
+
+
+def _handle_cases(message) -> None:
+    """Кнопка «Кейсы»: кейсы и предложение оставить заявку."""
+    track_user_interaction(message, button="cases")
+    # Показываем информацию о кейсах и предлагаем оставить заявку
+    bot.send_message(message.chat.id, _CASES_TEXT, parse_mode="Markdown")
+
+    # Предлагаем отправить контакт или ввести телефон вручную
+    bot.send_message(message.chat.id, _PHONE_REQUEST_TEXT, reply_markup=_KB_PHONE)
+
+
+def _handle_admin_stats(message) -> None:
+    """Кнопка «Статистика»: сводка за последние 30 дней (только для администратора)."""
+    # Кнопка видна только администратору, но на всякий случай ещё раз проверяем
+    if message.from_user.id != ADMIN_ID:
+        track_user_interaction(message, button=None)
+        bot.send_message(message.chat.id, "Эта функция доступна только админу.")
+        return
+
+    # Просмотр статистики администратором не учитываем как взаимодействие:
+    # иначе каждый просмотр сам меняет метрики и добавляет запись в БД
+    total_users, about_clicks, cases_clicks, total_messages = get_month_stats(
+        days=30
+    )
+    text_stats = (
+        "📊 *Статистика за последние 30 дней*\n\n"
+        f"Пользователей взаимодействовало: *{total_users}*\n"
+        f"Нажатий «О нас»: *{about_clicks}*\n"
+        f"Нажатий «Кейсы»: *{cases_clicks}*\n"
+        f"Всего сообщений: *{total_messages}*"
+    )
+    bot.send_message(message.chat.id, text_stats, parse_mode="Markdown")
+
+
+# Обработчики кнопок основной клавиатуры по тексту кнопки
+_BUTTON_HANDLERS = {
+    "О нас": _handle_about,
+    "Кейсы": _handle_cases,
+    "Статистика": _handle_admin_stats,
+}
+
+
 @bot.message_handler(content_types=["text"])
 def handle_text(message):
     """Обработка нажатий на кнопки и текстовых сообщений."""
     text = message.text.strip()
 
-    if text == "О нас":
-        track_user_interaction(message, button="about")
-        bot.send_message(
-            message.chat.id,
-            "🧾 *О нас*\n\n"
-            "Мы создаём телеграм-ботов и автоматизируем бизнес-процессы.\n"
-            "Помогаем компаниям экономить время и увеличивать продажи.",
-            parse_mode="Markdown",
-        )
-    elif text == "Кейсы":
-        track_user_interaction(message, button="cases")
-        # Показываем информацию о кейсах и предлагаем оставить заявку
-        cases_info = (
-            "📌 *Кейсы*\n\n"
-            "1. Бот для поддержки клиентов — сократил нагрузку на операторов на 40%.\n"
-            "2. Бот для заявок в отдел продаж — ускорил обработку лидов в 2 раза.\n"
-            "3. Внутренний бот-комбайн — автоматизировал рутинные задачи в команде.\n\n"
-            "💡 *Хотите получить наш продукт?*\n\n"
-            "Это очень просто! Оставьте заявку, указав ваш номер телефона, "
-            "и мы свяжемся с вами в ближайшее время."
-        )
-        bot.send_message(
-            message.chat.id,
-            cases_info,
-            parse_mode="Markdown",
-        )
-        
-        # Предлагаем отправить контакт или ввести телефон вручную
-        keyboard_phone = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-        btn_contact = types.KeyboardButton("📞 Отправить контакт", request_contact=True)
-        keyboard_phone.add(btn_contact)
-        
-        bot.send_message(
-            message.chat.id,
-            "Пожалуйста, отправьте ваш номер телефона для связи.\n"
-            "Вы можете нажать кнопку ниже или ввести номер вручную.",
-            reply_markup=keyboard_phone,
-        )
-    elif text == "Статистика":
-        # Кнопка видна только администратору, но на всякий случай ещё раз проверяем
-        if message.from_user.id != ADMIN_ID:
-            track_user_interaction(message, button=None)
-            bot.send_message(message.chat.id, "Эта функция доступна только админу.")
-            return
-
-        track_user_interaction(message, button=None)
-        total_users, about_clicks, cases_clicks, total_messages = get_month_stats(
-            days=30
-        )
-        text_stats = (
-            "📊 *Статистика за последние 30 дней*\n\n"
-            f"Пользователей взаимодействовало: *{total_users}*\n"
-            f"Нажатий «О нас»: *{about_clicks}*\n"
-            f"Нажатий «Кейсы»: *{cases_clicks}*\n"
-            f"Всего сообщений: *{total_messages}*"
-        )
-        bot.send_message(message.chat.id, text_stats, parse_mode="Markdown")
+    handler = _BUTTON_HANDLERS.get(text)
+    if handler is not None:
+        handler(message)
+    # Проверяем, не является ли текст номером телефона
+    elif is_phone_number(text):
+        # Пользователь ввёл номер телефона
+        _accept_application(message, text, "Выберите нужный раздел:")
     else:
-        # Проверяем, не является ли текст номером телефона
-        if is_phone_number(text):
-            # Пользователь ввёл номер телефона
-            user = message.from_user
-            save_application(user, text)
-            
-            # Благодарим пользователя
-            bot.send_message(
-                message.chat.id,
-                "✅ Спасибо за ваше обращение!\n\n"
-                "Мы получили вашу заявку и свяжемся с вами в ближайшее время.",
-            )
-            
-            # Возвращаем обычную клавиатуру
-            keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            btn_about = types.KeyboardButton("О нас")
-            btn_cases = types.KeyboardButton("Кейсы")
-            if message.from_user.id == ADMIN_ID:
-                btn_stats = types.KeyboardButton("Статистика")
-                keyboard.row(btn_about, btn_cases, btn_stats)
-            else:
-                keyboard.add(btn_about, btn_cases)
-            
-            bot.send_message(
-                message.chat.id,
-                "Выберите нужный раздел:",
-                reply_markup=keyboard,
-            )
-        else:
-            # Любой другой текст тоже записываем как взаимодействие
-            track_user_interaction(message, button=None)
-            bot.send_message(
-                message.chat.id,
-                "Я тебя не понял. Пожалуйста, выбери одну из кнопок: «О нас» или «Кейсы».",
-            )
+        # Любой другой текст тоже записываем как взаимодействие
+        track_user_interaction(message, button=None)
+        bot.send_message(message.chat.id, _NO_UNDERSTAND_TEXT)
+
+
+def close_db() -> None:
+    """Обновляет статистику планировщика SQLite (PRAGMA optimize) и закрывает соединения пула."""
+    while True:
+        try:
+            conn = _POOL.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        conn.close()
+
+
+def _exit_on_sigterm(signum, frame) -> None:
+    """Завершает процесс по SIGTERM так же, как по Ctrl+C, чтобы сработал atexit."""
+    raise SystemExit(0)
 
 
 if __name__ == "__main__":
     init_db()
-    # Проверяем и сохраняем статистику за предыдущий месяц, если сегодня 1-е число
+    _storage.start()
+    # При остановке бота (Ctrl+C или SIGTERM от docker stop) дописываем
+    # в БД накопившиеся события
+    # (atexit вызывает функции в обратном порядке: сначала flush, затем close_db)
+    atexit.register(close_db)
+    atexit.register(_storage.flush)
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    # Сохраняем статистику за предыдущий месяц, если она ещё не сохранена
     check_and_save_monthly_stats()
+    # Дальше статистика сохраняется по таймеру 1-го числа каждого месяца
+    schedule_monthly_stats()
     print("Бот запущен. Нажми Ctrl+C, чтобы остановить.")
-    # Не обрабатывать сообщения, отправленные пока бот был выключен
-    bot.infinity_polling(skip_pending=True)
+    # Не обрабатывать сообщения, отправленные пока бот был выключен.
+    # Сервер Telegram держит запрос getUpdates до 60 секунд, поэтому в простое
+    # бот делает один запрос в минуту, а новые сообщения приходят сразу
+    bot.infinity_polling(skip_pending=True, long_polling_timeout=60)